@@ -1,3 +1,4 @@
+import numpy as np
 import pygame
 import random
 import sys
@@ -19,6 +20,7 @@ WIDTH = CELL_SIZE * COLS
 HEIGHT = CELL_SIZE * ROWS
 SIDE_PANEL = 200
 FPS = 60
+KICKS = (0, -1, 1, -2, 2)  # column offsets tried when a rotation collides
 
 # Colors
 BLACK = (0, 0, 0)
@@ -34,6 +36,15 @@ COLORS = [
     (240, 0, 0),    # Z - red
 ]
 
+# Fonts, created on first use; SysFont searches the system fonts on every call
+_fonts = {}
+
+def get_font(size, bold=False):
+    font = _fonts.get((size, bold))
+    if font is None:
+        font = _fonts[(size, bold)] = pygame.font.SysFont('Calibri', size, bold=bold)
+    return font
+
 # Tetromino shapes (4x4 matrix strings)
 SHAPES = [
     ["....",
@@ -94,6 +105,36 @@ def rotations_from_pattern(pattern):
 
 SHAPES_ROT = [rotations_from_pattern(p) for p in SHAPES]
 
+# Bitboard: one int per board row, bit c set if column c is occupied
+FULL_ROW_MASK = (1 << COLS) - 1
+
+def pack_state(state):
+    # (min_c, max_c, bits per piece row) with bits relative to x = 0;
+    # states are normalized, so row 0 is the top of the piece
+    rows = [0] * (max(r for r, _ in state) + 1)
+    for r, c in state:
+        rows[r] |= 1 << c
+    cols = [c for _, c in state]
+    return min(cols), max(cols), np.array(rows, dtype=np.int64)
+
+# Precomputed per (shape_idx, rot): packed rows for collision tests and
+# (dx, dy) cell offsets for rendering
+PIECE_ROWS = [[pack_state(s) for s in states] for states in SHAPES_ROT]
+PIECE_CELLS = [[tuple((c, r) for r, c in s) for s in states] for states in SHAPES_ROT]
+
+# Whole-board bitboard: one Python int with bit (y * COLS + x) set for each
+# locked cell, so row 0 is the low bits. Pieces are pre-packed the same way
+# at x = 0, y = 0 and shifted into place for each test.
+ROW_MASK = [FULL_ROW_MASK << (r * COLS) for r in range(ROWS)]
+PIECE_AT_ORIGIN = [[sum(int(b) << (i * COLS) for i, b in enumerate(rows))
+                    for _, _, rows in states] for states in PIECE_ROWS]
+
+def piece_bits(origin, x, y):
+    # a negative shift drops the rows above the top; callers check the walls
+    # first, so no cell wraps into a neighbouring row
+    shift = y * COLS + x
+    return origin << shift if shift >= 0 else origin >> -shift
+
 class Piece:
     def __init__(self, x, y, shape_idx):
         self.x = x
@@ -101,120 +142,282 @@ class Piece:
         self.shape_idx = shape_idx
         self.rot = 0
         self.states = SHAPES_ROT[shape_idx]
+        self.nrot = len(self.states)
         self.color = COLORS[shape_idx]
+        self.color_idx = shape_idx + 1  # value stored in GameState.color_index
 
     def get_cells(self, x_offset=0, y_offset=0, rot=None):
         if rot is None:
             rot = self.rot
-        cells = []
-        for r, c in self.states[rot]:
-            cells.append((self.x + c + x_offset, self.y + r + y_offset))
-        return cells
-
-def create_grid(locked_positions=None):
-    grid = [[BLACK for _ in range(COLS)] for _ in range(ROWS)]
-    if locked_positions:
-        for (x, y), color in locked_positions.items():
-            if 0 <= y < ROWS and 0 <= x < COLS:
-                grid[y][x] = color
-    return grid
-
-def valid_space(piece, locked):
-    for x, y in piece.get_cells():
-        if x < 0 or x >= COLS or y >= ROWS:
-            return False
-        if y >= 0 and (x, y) in locked:
+        x = self.x + x_offset
+        y = self.y + y_offset
+        return [(x + dx, y + dy) for dx, dy in PIECE_CELLS[self.shape_idx][rot]]
+
+def create_grid():
+    # one contiguous uint8 plane of the board, indexed [row, col]
+    return np.zeros((ROWS, COLS), dtype=np.uint8)
+
+class GameState:
+    # Board plus the falling piece. The piece is kept as plain ints so moves
+    # never touch a Piece object; tetris_core.GameState is a compiled drop-in.
+    def __init__(self, piece_rows, kicks):
+        self.piece_rows = piece_rows
+        self.kicks = kicks
+        self.board_bits = 0  # locked cells, see ROW_MASK
+        # board as two planes: occupancy (0/1) and color index (shape_idx + 1)
+        self.occ = create_grid()
+        self.color_index = create_grid()
+        self.px = self.py = self.prot = self.pshape = 0
+        self.pnrot = 1
+        # per-rotation tables of the current shape, looked up once per spawn
+        self.pstates = self.porigins = None
+
+    def spawn(self, piece):
+        self.px, self.py = piece.x, piece.y
+        self.prot, self.pshape, self.pnrot = piece.rot, piece.shape_idx, piece.nrot
+        self.pstates = self.piece_rows[piece.shape_idx]
+        self.porigins = PIECE_AT_ORIGIN[piece.shape_idx]
+
+    def fits(self, x, y, rot):
+        min_c, max_c, rows = self.pstates[rot]
+        if x + min_c < 0 or x + max_c >= COLS or y + len(rows) > ROWS:
             return False
-    return True
+        return not self.board_bits & piece_bits(self.porigins[rot], x, y)
 
-def check_lost(locked):
-    for (x, y) in locked:
-        if y < 1:
-            return True
-    return False
+    def move(self, dx, dy):
+        if not self.fits(self.px + dx, self.py + dy, self.prot):
+            return False
+        self.px += dx
+        self.py += dy
+        return True
+
+    def rotate(self):
+        # try in place, then simple wall kicks from the same base column
+        rot = (self.prot + 1) % self.pnrot
+        x, y = self.px, self.py
+        for dx in self.kicks:
+            if self.fits(x + dx, y, rot):
+                self.px = x + dx
+                self.prot = rot
+                return True
+        return False
+
+    def hard_drop(self):
+        x, y, rot = self.px, self.py, self.prot
+        while self.fits(x, y + 1, rot):
+            y += 1
+        self.py = y
+
+    def lock(self):
+        # write the piece into the board; False if part of it is above the top
+        origin = self.porigins[self.prot]
+        self.board_bits |= piece_bits(origin, self.px, self.py)
+        for x, y in self.piece_cells():
+            if y >= 0:
+                self.occ[y, x] = 1
+                self.color_index[y, x] = self.pshape + 1
+        return self.py >= 0
+
+    def clear_rows(self):
+        full = self.occ.all(axis=1)
+        cleared = int(full.sum())
+        if not cleared:
+            return 0
+        # one row mask moves both planes; kept rows settle at the bottom
+        keep = ~full
+        for plane in (self.occ, self.color_index):
+            plane[cleared:] = plane[keep]
+            plane[:cleared] = 0
+        board = self.board_bits
+        for r in np.flatnonzero(full).tolist():
+            # rows above r are the lower bits: drop row r and move them down
+            above = board & ((1 << (r * COLS)) - 1)
+            board = (above << COLS) | (board >> ((r + 1) * COLS) << ((r + 1) * COLS))
+        self.board_bits = board
+        return cleared
+
+    def piece_cells(self):
+        return [(self.px + dx, self.py + dy) for dx, dy in PIECE_CELLS[self.pshape][self.prot]]
+
+try:
+    # optional Cython build of GameState: cythonize -i tetris_core.pyx
+    from tetris_core import GameState
+except ImportError:
+    pass
+
+def check_lost(board_bits):
+    return board_bits & ROW_MASK[0] != 0
 
 def get_random_piece():
     idx = random.randrange(len(SHAPES_ROT))
     # spawn near top center
     return Piece(COLS // 2 - 2, -1, idx)
 
-def clear_rows(grid, locked):
-    cleared = 0
-    for r in range(ROWS - 1, -1, -1):
-        if all(grid[r][c] != BLACK for c in range(COLS)):
-            cleared += 1
-            # remove locked blocks in that row
-            for c in range(COLS):
-                if (c, r) in locked:
-                    del locked[(c, r)]
-            # shift everything down
-            for key in sorted(list(locked.keys()), key=lambda p: p[1])[::-1]:
-                x, y = key
-                if y < r:
-                    color = locked.pop(key)
-                    locked[(x, y + 1)] = color
-    return cleared
-
 def draw_text_middle(surface, text, size, color, offset_x=0, offset_y=0):
-    font = pygame.font.SysFont('Calibri', size, bold=True)
+    font = get_font(size, bold=True)
     label = font.render(text, True, color)
     surface.blit(label, (WIDTH // 2 - label.get_width() // 2 + offset_x,
                          HEIGHT // 2 - label.get_height() // 2 + offset_y))
 
-def draw_grid(surface, grid):
+def make_cell_surface(color):
+    cell = pygame.Surface((CELL_SIZE, CELL_SIZE))
+    cell.fill(color)
+    pygame.draw.rect(cell, GRAY, (0, 0, CELL_SIZE, CELL_SIZE), 1)
+    return cell
+
+def make_grid_lines():
+    # every cell's 1px border as full-length lines: each cell has an edge at
+    # both its first and last pixel, so neighbouring cells show a 2px line
+    lines = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    for c in range(COLS):
+        for x in (c * CELL_SIZE, (c + 1) * CELL_SIZE - 1):
+            pygame.draw.line(lines, GRAY, (x, 0), (x, HEIGHT - 1))
     for r in range(ROWS):
-        for c in range(COLS):
-            pygame.draw.rect(surface, grid[r][c],
-                             (c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-            pygame.draw.rect(surface, GRAY,
-                             (c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE), 1)
+        for y in (r * CELL_SIZE, (r + 1) * CELL_SIZE - 1):
+            pygame.draw.line(lines, GRAY, (0, y), (WIDTH - 1, y))
+    return lines
+
+# Cached drawing surfaces: one bordered cell per grid color index (0 is
+# empty), the grid-line overlay and the empty playfield
+CELL_SURF = [make_cell_surface(color) for color in [BLACK] + COLORS]
+RECT_AT = [[(c * CELL_SIZE, r * CELL_SIZE) for c in range(COLS)] for r in range(ROWS)]
+GRID_LINES = make_grid_lines()
+GRID_BG = pygame.Surface((WIDTH, HEIGHT))
+GRID_BG.fill(BLACK)
+GRID_BG.blit(GRID_LINES, (0, 0))
+PANEL_RECT = pygame.Rect(WIDTH, 0, SIDE_PANEL, HEIGHT)
+PLAYFIELD_RECT = pygame.Rect(0, 0, WIDTH, HEIGHT)
+PANEL_X = WIDTH + 20
+PREVIEW_Y = 60  # top of the 4x4 "Next" box
+
+def make_piece_surface(shape_idx, rot):
+    # the piece's bounding box with its cells drawn in, transparent elsewhere
+    min_c, max_c, rows = PIECE_ROWS[shape_idx][rot]
+    piece = pygame.Surface(((max_c + 1) * CELL_SIZE, len(rows) * CELL_SIZE), pygame.SRCALPHA)
+    piece.blits([(CELL_SURF[shape_idx + 1], (dx * CELL_SIZE, dy * CELL_SIZE))
+                 for dx, dy in PIECE_CELLS[shape_idx][rot]], False)
+    return piece
+
+PIECE_SURF = [[make_piece_surface(s, rot) for rot in range(len(states))]
+              for s, states in enumerate(PIECE_ROWS)]
+
+def draw_grid(surface, occ, color_index):
+    surface.blit(GRID_BG, (0, 0))
+    # one batched call for the occupied cells only
+    rows, cols = np.nonzero(occ)
+    surface.blits([(CELL_SURF[idx], RECT_AT[r][c])
+                   for r, c, idx in zip(rows.tolist(), cols.tolist(),
+                                        color_index[rows, cols].tolist())], False)
+
+def compute_preview_rects(piece):
+    # (cell surface, position) pairs for the "Next" box, computed once per piece
+    piece.preview_rects = [(CELL_SURF[piece.color_idx],
+                            (PANEL_X + (dx + 1) * CELL_SIZE, PREVIEW_Y + (dy + 1) * CELL_SIZE))
+                           for dx, dy in PIECE_CELLS[piece.shape_idx][0]]
+
+def make_panel_chrome():
+    # the static part of the side panel: background, title and empty "Next" box
+    chrome = pygame.Surface(PANEL_RECT.size)
+    chrome.fill((20, 20, 20))
+    panel_x = PANEL_X - WIDTH
+    chrome.blit(get_font(24).render("Next:", True, WHITE), (panel_x, 20))
+    chrome.blits([(CELL_SURF[0], (panel_x + c * CELL_SIZE, PREVIEW_Y + r * CELL_SIZE))
+                  for r in range(4) for c in range(4)], False)
+    return chrome
+
+PANEL_CHROME = make_panel_chrome()
 
 def draw_side_panel(surface, score, level, next_piece):
-    panel_x = WIDTH + 20
-    font = pygame.font.SysFont('Calibri', 24)
-    title = font.render("Next:", True, WHITE)
-    surface.blit(title, (panel_x, 20))
-
-    # Draw next piece in a small box
-    box_x = panel_x
-    box_y = 60
-    box_size = CELL_SIZE
-    for r in range(4):
-        for c in range(4):
-            pygame.draw.rect(surface, BLACK,
-                             (box_x + c * box_size, box_y + r * box_size, box_size, box_size))
-            pygame.draw.rect(surface, GRAY,
-                             (box_x + c * box_size, box_y + r * box_size, box_size, box_size), 1)
+    panel_x = PANEL_X
+    font = get_font(24)
+    surface.blit(PANEL_CHROME, PANEL_RECT)
 
+    box_y = PREVIEW_Y
+    box_size = CELL_SIZE
     if next_piece:
-        for x, y in next_piece.get_cells(x_offset=0, y_offset=0, rot=0):
-            # next_piece coordinates are relative; shift to top-left of box
-            nx = box_x + (x - next_piece.x + 1) * box_size
-            ny = box_y + (y - next_piece.y + 1) * box_size
-            pygame.draw.rect(surface, next_piece.color, (nx, ny, box_size, box_size))
-            pygame.draw.rect(surface, GRAY, (nx, ny, box_size, box_size), 1)
-
-    score_label = font.render(f"Score: {score}", True, WHITE)
-    level_label = font.render(f"Level: {level}", True, WHITE)
-    surface.blit(score_label, (panel_x, box_y + 5 * box_size))
-    surface.blit(level_label, (panel_x, box_y + 5 * box_size + 30))
-
-def draw_window(surface, grid, score, level, next_piece):
-    surface.fill(BLACK)
-    draw_grid(surface, grid)
-    # side panel background
-    pygame.draw.rect(surface, (20, 20, 20), (WIDTH, 0, SIDE_PANEL, HEIGHT))
-    draw_side_panel(surface, score, level, next_piece)
-    pygame.display.update()
+        surface.blits(next_piece.preview_rects, False)
+
+    # labels are kept on the function and re-rendered only when they change
+    if getattr(draw_side_panel, '_score', None) != score:
+        draw_side_panel._score = score
+        draw_side_panel._score_surf = font.render(f"Score: {score}", True, WHITE)
+    if getattr(draw_side_panel, '_level', None) != level:
+        draw_side_panel._level = level
+        draw_side_panel._level_surf = font.render(f"Level: {level}", True, WHITE)
+    surface.blit(draw_side_panel._score_surf, (panel_x, box_y + 5 * box_size))
+    surface.blit(draw_side_panel._level_surf, (panel_x, box_y + 5 * box_size + 30))
+
+def draw_window(surface, board_surf, piece_surf, piece_pos, score, level, next_piece,
+                board_dirty=None):
+    # board_dirty: playfield rects to restore from board_surf, None redraws all.
+    # Returns the screen rect the piece was drawn to.
+    panel = (score, level, next_piece)
+    if board_dirty is None:
+        # board_surf and the panel chrome cover the whole window between them
+        surface.blit(board_surf, (0, 0))
+        piece_rect = surface.blit(piece_surf, piece_pos)
+        draw_side_panel(surface, score, level, next_piece)
+        draw_window._panel = panel
+        pygame.display.update()
+        return piece_rect
+
+    # restore the board under the old piece position, then draw the piece
+    dirty = [surface.blit(board_surf, rect, rect) for rect in board_dirty]
+    piece_rect = surface.blit(piece_surf, piece_pos)
+    dirty.append(piece_rect)
+    if draw_window._panel != panel:
+        draw_side_panel(surface, score, level, next_piece)
+        draw_window._panel = panel
+        dirty.append(PANEL_RECT)
+    pygame.display.update(dirty)
+    return piece_rect
+
+# Gameplay key handlers; each returns True when the piece should lock now
+def move_left(state):
+    state.move(-1, 0)
+    return False
+
+def move_right(state):
+    state.move(1, 0)
+    return False
+
+def soft_drop(state):
+    state.move(0, 1)
+    return False
+
+def rotate(state):
+    state.rotate()
+    return False
+
+def hard_drop(state):
+    state.hard_drop()
+    return True
+
+KEY_HANDLERS = {
+    pygame.K_LEFT: move_left,
+    pygame.K_RIGHT: move_right,
+    pygame.K_DOWN: soft_drop,
+    pygame.K_UP: rotate,
+    pygame.K_SPACE: hard_drop,
+}
+# only these keys act again while held; the rest act once per press
+REPEAT_KEYS = {pygame.K_LEFT, pygame.K_RIGHT, pygame.K_DOWN}
+KEY_REPEAT = (170, 50)  # auto-repeat delay and interval in ms
+EVENT_TYPES = (pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.VIDEOEXPOSE)
 
 def main():
     win = pygame.display.set_mode((WIDTH + SIDE_PANEL, HEIGHT))
     clock = pygame.time.Clock()
-    locked_positions = {}  # (x,y): color
-    grid = create_grid(locked_positions)
-
-    current_piece = get_random_piece()
+    # drop every other event type at the SDL level and let SDL repeat keys
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(EVENT_TYPES)
+    pygame.key.set_repeat(*KEY_REPEAT)
+    state = GameState(PIECE_ROWS, KICKS)
+    board_surf = GRID_BG.copy()  # locked cells, updated only on lock and clear
+
+    state.spawn(get_random_piece())
     next_piece = get_random_piece()
+    compute_preview_rects(next_piece)
     change_piece = False
     running = True
     paused = False
@@ -223,6 +426,10 @@ def main():
     level = 1
     score = 0
     lines_cleared_total = 0
+    redraw_all = True  # first frame paints the whole window
+    needs_redraw = True  # set whenever something visible may have changed
+    board_dirty = []  # playfield rects to restore from board_surf next draw
+    held = set()  # keys currently down, to ignore auto-repeat where unwanted
 
     while running:
         dt = clock.tick(FPS) / 1000.0
@@ -232,89 +439,82 @@ def main():
         # adjust speed by level
         fall_speed = max(0.05, 0.8 - (level - 1) * 0.07)
 
-        for event in pygame.event.get():
+        for event in pygame.event.get(EVENT_TYPES):
             if event.type == pygame.QUIT:
                 running = False
                 break
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-                    break
-                if event.key == pygame.K_p:
-                    paused = not paused
-                if not paused:
-                    if event.key == pygame.K_LEFT:
-                        current_piece.x -= 1
-                        if not valid_space(current_piece, locked_positions):
-                            current_piece.x += 1
-                    elif event.key == pygame.K_RIGHT:
-                        current_piece.x += 1
-                        if not valid_space(current_piece, locked_positions):
-                            current_piece.x -= 1
-                    elif event.key == pygame.K_DOWN:
-                        current_piece.y += 1
-                        if not valid_space(current_piece, locked_positions):
-                            current_piece.y -= 1
-                    elif event.key == pygame.K_UP:
-                        current_piece.rot = (current_piece.rot + 1) % len(current_piece.states)
-                        if not valid_space(current_piece, locked_positions):
-                            # try wall kicks (simple)
-                            kicked = False
-                            for dx in (-1, 1, -2, 2):
-                                current_piece.x += dx
-                                if valid_space(current_piece, locked_positions):
-                                    kicked = True
-                                    break
-                                current_piece.x -= dx
-                            if not kicked:
-                                current_piece.rot = (current_piece.rot - 1) % len(current_piece.states)
-                    elif event.key == pygame.K_SPACE:
-                        # hard drop
-                        while valid_space(current_piece, locked_positions):
-                            current_piece.y += 1
-                        current_piece.y -= 1
-                        change_piece = True
+            if event.type == pygame.VIDEOEXPOSE:
+                # the window was uncovered; dirty rects alone won't restore it
+                redraw_all = needs_redraw = True
+                continue
+            if event.type == pygame.KEYUP:
+                held.discard(event.key)
+                continue
+            if event.key in held and event.key not in REPEAT_KEYS:
+                continue
+            held.add(event.key)
+            needs_redraw = True
+            if event.key == pygame.K_ESCAPE:
+                running = False
+                break
+            if event.key == pygame.K_p:
+                paused = not paused
+            if not paused:
+                handler = KEY_HANDLERS.get(event.key)
+                if handler and handler(state):
+                    change_piece = True
 
         if not paused and fall_time >= fall_speed:
             fall_time = 0
-            current_piece.y += 1
-            if not valid_space(current_piece, locked_positions):
-                current_piece.y -= 1
+            needs_redraw = True
+            if not state.move(0, 1):
                 change_piece = True
 
         # Lock piece and spawn next
         if change_piece:
-            for x, y in current_piece.get_cells():
-                if y < 0:
-                    # piece is above top -> game over
-                    running = False
-                    break
-                locked_positions[(x, y)] = current_piece.color
-            current_piece = next_piece
+            if not state.lock():
+                # piece is above top -> game over
+                running = False
+            # bake the locked piece into the board surface
+            board_dirty.append(board_surf.blit(PIECE_SURF[state.pshape][state.prot],
+                                               (state.px * CELL_SIZE, state.py * CELL_SIZE)))
+            state.spawn(next_piece)
             next_piece = get_random_piece()
+            compute_preview_rects(next_piece)
             change_piece = False
+            needs_redraw = True
 
-            grid = create_grid(locked_positions)
-            cleared = clear_rows(grid, locked_positions)
+            cleared = state.clear_rows()
             if cleared > 0:
+                # every row above a cleared one moved down
+                draw_grid(board_surf, state.occ, state.color_index)
+                board_dirty.append(PLAYFIELD_RECT)
                 lines_cleared_total += cleared
                 # scoring: simple scheme
                 score += {1: 100, 2: 300, 3: 500, 4: 800}.get(cleared, cleared * 200)
                 level = lines_cleared_total // 10 + 1
-            grid = create_grid(locked_positions)
-
-        # draw current piece onto a working grid copy
-        temp_grid = create_grid(locked_positions)
-        for x, y in current_piece.get_cells():
-            if 0 <= y < ROWS and 0 <= x < COLS:
-                temp_grid[y][x] = current_piece.color
 
-        draw_window(win, temp_grid, score, level, next_piece)
+        if not needs_redraw:
+            continue
+
+        # the board surface plus one blit of the piece's own surface
+        piece_surf = PIECE_SURF[state.pshape][state.prot]
+        piece_pos = (state.px * CELL_SIZE, state.py * CELL_SIZE)
+        if redraw_all:
+            redraw_all = False
+            prev_rect = draw_window(win, board_surf, piece_surf, piece_pos,
+                                    score, level, next_piece)
+        else:
+            board_dirty.append(prev_rect)
+            prev_rect = draw_window(win, board_surf, piece_surf, piece_pos,
+                                    score, level, next_piece, board_dirty)
+        board_dirty.clear()
+        needs_redraw = False
 
     # Game over screen
     win.fill(BLACK)
     draw_text_middle(win, "GAME OVER", 48, WHITE)
-    font = pygame.font.SysFont('Calibri', 24)
+    font = get_font(24)
     label = font.render(f"Score: {score}", True, WHITE)
     win.blit(label, (WIDTH // 2 - label.get_width() // 2, HEIGHT // 2 + 40))
     pygame.display.update()
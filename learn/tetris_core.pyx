@@ -0,0 +1,135 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# tetris_core.pyx
+# Compiled drop-in for tetris.GameState: board and falling piece as C ints.
+# Build in place with: cythonize -i tetris_core.pyx
+# tetris.py picks it up automatically when the extension is importable.
+
+import numpy as np
+
+# must match ROWS/COLS in tetris.py
+cdef enum:
+    ROWS = 20
+    COLS = 10
+    FULL_ROW_MASK = (1 << COLS) - 1
+    MAX_SHAPES = 8
+    MAX_ROT = 4
+    MAX_KICKS = 8
+
+cdef class GameState:
+    cdef unsigned int row_masks[ROWS]
+    # board planes as in tetris.GameState, plus typed views for writing them
+    cdef readonly object occ, color_index
+    cdef unsigned char[:, ::1] occ_view, color_view
+    cdef public int px, py, prot, pshape
+
+    # packed piece tables, copied from tetris.PIECE_ROWS
+    cdef unsigned int bits[MAX_SHAPES][MAX_ROT][4]
+    cdef int height[MAX_SHAPES][MAX_ROT]
+    cdef int min_c[MAX_SHAPES][MAX_ROT]
+    cdef int max_c[MAX_SHAPES][MAX_ROT]
+    cdef int nrot[MAX_SHAPES]
+    cdef int kicks[MAX_KICKS]
+    cdef int nkicks
+
+    def __init__(self, piece_rows, kicks):
+        cdef int s, r, i
+        self.occ = np.zeros((ROWS, COLS), dtype=np.uint8)
+        self.color_index = np.zeros((ROWS, COLS), dtype=np.uint8)
+        self.occ_view = self.occ
+        self.color_view = self.color_index
+        for i in range(ROWS):
+            self.row_masks[i] = 0
+        for s, states in enumerate(piece_rows):
+            self.nrot[s] = len(states)
+            for r, (lo, hi, rows) in enumerate(states):
+                self.min_c[s][r] = lo
+                self.max_c[s][r] = hi
+                self.height[s][r] = len(rows)
+                for i, b in enumerate(rows):
+                    self.bits[s][r][i] = b
+        self.nkicks = len(kicks)
+        for i, dx in enumerate(kicks):
+            self.kicks[i] = dx
+        self.px = self.py = self.prot = self.pshape = 0
+
+    def spawn(self, piece):
+        self.px, self.py = piece.x, piece.y
+        self.prot, self.pshape = piece.rot, piece.shape_idx
+
+    cpdef bint fits(self, int x, int y, int rot):
+        cdef int s = self.pshape, i
+        if (x + self.min_c[s][rot] < 0 or x + self.max_c[s][rot] >= COLS
+                or y + self.height[s][rot] > ROWS):
+            return False
+        for i in range(self.height[s][rot]):
+            if y + i >= 0 and self.row_masks[y + i] & (self.bits[s][rot][i] << x):
+                return False
+        return True
+
+    cpdef bint move(self, int dx, int dy):
+        if not self.fits(self.px + dx, self.py + dy, self.prot):
+            return False
+        self.px += dx
+        self.py += dy
+        return True
+
+    cpdef bint rotate(self):
+        # try in place, then simple wall kicks from the same base column
+        cdef int rot = (self.prot + 1) % self.nrot[self.pshape], i
+        for i in range(self.nkicks):
+            if self.fits(self.px + self.kicks[i], self.py, rot):
+                self.px += self.kicks[i]
+                self.prot = rot
+                return True
+        return False
+
+    cpdef hard_drop(self):
+        while self.fits(self.px, self.py + 1, self.prot):
+            self.py += 1
+
+    cpdef bint lock(self):
+        # write the piece into the board; False if part of it is above the top
+        cdef int s = self.pshape, rot = self.prot, i, c, y
+        cdef unsigned int shifted
+        cdef bint on_board = True
+        for i in range(self.height[s][rot]):
+            y = self.py + i
+            if y < 0:
+                on_board = False
+                continue
+            shifted = self.bits[s][rot][i] << self.px
+            self.row_masks[y] |= shifted
+            for c in range(COLS):
+                if shifted >> c & 1:
+                    self.occ_view[y, c] = 1
+                    self.color_view[y, c] = s + 1
+        return on_board
+
+    cpdef int clear_rows(self):
+        # move the non-full rows down over the full ones, then empty the top
+        cdef int src, dst = ROWS - 1, c, cleared
+        for src in range(ROWS - 1, -1, -1):
+            if self.row_masks[src] != FULL_ROW_MASK:
+                if dst != src:
+                    self.row_masks[dst] = self.row_masks[src]
+                    self.occ_view[dst, :] = self.occ_view[src, :]
+                    self.color_view[dst, :] = self.color_view[src, :]
+                dst -= 1
+        cleared = dst + 1
+        for src in range(cleared):
+            self.row_masks[src] = 0
+            for c in range(COLS):
+                self.occ_view[src, c] = 0
+                self.color_view[src, c] = 0
+        return cleared
+
+    def piece_cells(self):
+        cdef int s = self.pshape, rot = self.prot, i, c
+        cdef unsigned int b
+        cells = []
+        for i in range(self.height[s][rot]):
+            b = self.bits[s][rot][i]
+            for c in range(COLS):
+                if b >> c & 1:
+                    cells.append((self.px + c, self.py + i))
+        return cells